@@ -1,14 +1,18 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import requests
-from datetime import datetime
-import pytz
+from requests_cache import CachedSession
+import orjson
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
 import numpy as np
-from PIL import Image
 import io
-import base64
+import hashlib
 import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from github import Github
 
 # Mobile-first configuration
@@ -18,16 +22,26 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Mobile-optimized CSS
-st.markdown("""
-    <style>
-    [data-testid="stMain"] { max-width: 100%; }
-    button { width: 100%; padding: 1rem; font-size: 1.1rem; font-weight: bold; border-radius: 10px; }
-    .alert-banner { padding: 1.5rem; border-radius: 10px; margin: 1rem 0; text-align: center; }
-    .service-ready { background: linear-gradient(135deg, #28a745 0%, #20c997 100%); color: white; padding: 2rem; border-radius: 15px; margin: 1rem 0; }
-    .action-button { background: #dc3545; color: white; font-weight: bold; padding: 1.5rem; }
-    </style>
-    """, unsafe_allow_html=True)
+# Mobile-optimized CSS, read from disk once per process
+@st.cache_resource
+def load_css():
+    with open(os.path.join(os.path.dirname(__file__), "assets", "styles.css")) as f:
+        return f"<style>{f.read()}</style>"
+
+st.markdown(load_css(), unsafe_allow_html=True)
+
+# USGS feeds
+USGS_HOUR_URL = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_hour.geojson"
+USGS_MONTH_URL = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_month.geojson"
+# Seconds each feed stays fresh; the hourly feed drives the earthquake alert
+FEED_TTL = {USGS_HOUR_URL: 60, USGS_MONTH_URL: 600}
+
+# Philippines region (min_lon, min_lat, max_lon, max_lat)
+PH_BBOX = (119, 4, 131, 20)
+
+# Timezones
+PH_TZ = ZoneInfo('Asia/Manila')
+UTC_TZ = timezone.utc
 
 # Initialize session state
 if "earthquake_detected" not in st.session_state:
@@ -37,6 +51,12 @@ if "current_earthquake" not in st.session_state:
 if "assessment_results" not in st.session_state:
     st.session_state.assessment_results = None
 
+# Damage classes; the model's output order comes from its labels file, never from this tuple
+DAMAGE_CLASSES = ("SAFE", "DAMAGED", "UNSAFE")
+DAMAGE_MODEL_PATH = os.path.join(os.path.dirname(__file__), "model_unquant.tflite")
+# Teachable Machine export, one "<index> <class>" line per model output
+DAMAGE_LABELS_PATH = os.path.join(os.path.dirname(__file__), "labels.txt")
+
 # Damage recommendations
 DAMAGE_RECOMMENDATIONS = {
     "SAFE": {
@@ -76,9 +96,68 @@ DAMAGE_RECOMMENDATIONS = {
     }
 }
 
+# Pre-rendered result banners; only the confidence is filled in per assessment
+DAMAGE_BANNER_HTML = {
+    damage_class: f"""
+        <div style="background: {rec['bg_gradient']}; color: white; padding: 2rem; border-radius: 15px; margin: 1rem 0; text-align: center;">
+            <h1>{damage_class}</h1>
+            <p style="font-size: 1.1rem;">Confidence: {{confidence:.0f}}%</p>
+            <p style="font-size: 0.9rem; margin-top: 1rem;">Priority: {rec['priority']}</p>
+        </div>
+    """
+    for damage_class, rec in DAMAGE_RECOMMENDATIONS.items()
+}
+
+# Pre-rendered "What to Do" lists
+DAMAGE_ACTIONS_MD = {
+    damage_class: "\n\n".join(f"▸ {action}" for action in rec["actions"])
+    for damage_class, rec in DAMAGE_RECOMMENDATIONS.items()
+}
+
+# Shared earthquake map settings
+MAP_KWARGS = dict(
+    lat="latitude",
+    lon="longitude",
+    size="magnitude",
+    color="magnitude",
+    hover_name="place",
+    zoom=5,
+    height=500
+)
+MAP_COLUMNS = ["latitude", "longitude", "magnitude", "place"]
+# Dense months are thinned to the strongest events to keep the map payload small
+MAP_MAX_POINTS = 500
+MAP_LAYOUT = dict(mapbox_style="open-street-map", mapbox=dict(center=dict(lat=12.5, lon=125), zoom=5))
+
+# Static status banners (only the earthquake-detected variants need interpolation)
+NO_ALERT_CARD = """<div style="background: #28a745; color: white; padding: 1rem; border-radius: 10px; text-align: center;">
+                    <h3>NO ALERT</h3>
+                    <p style="font-size: 0.9rem; margin: 0;">Ready to monitor</p>
+                </div>"""
+COUNT_CARD = """<div style="padding: 1rem;">
+                    <p style="font-size: 0.9rem; margin: 0;">{label}</p>
+                    <p style="font-size: 2.25rem; margin: 0;">{count}</p>
+                </div>"""
+SERVICE_READY_HTML = """
+            <div style="background: linear-gradient(135deg, #28a745 0%, #20c997 100%); color: white; padding: 2rem; border-radius: 15px; margin: 1rem 0; text-align: center;">
+                <h2>SERVICE READY</h2>
+                <p>Damage assessment + dataset collection active</p>
+            </div>
+        """
+
 # ==================== LOCAL + GITHUB DATASET FUNCTIONS ====================
 
-def save_image_to_github(image, damage_class, earthquake_data):
+@st.cache_data(show_spinner=False)
+def get_github_repo_full_name(token, repo_name):
+    """Owner/name of the dataset repo, resolved once instead of on every save and dataset read"""
+    g = Github(token)
+    return g.get_user().get_repo(repo_name.split("/")[1]).full_name
+
+def get_github_repo(token, repo_name):
+    """Fresh repo handle per call; a PyGithub client can't be shared between sessions or threads"""
+    return Github(token).get_repo(get_github_repo_full_name(token, repo_name), lazy=True)
+
+def save_image_to_github(image_bytes, damage_class, earthquake_data, from_camera=False):
     """Save image to GitHub automatically"""
     try:
         # Get GitHub credentials
@@ -89,26 +168,30 @@ def save_image_to_github(image, damage_class, earthquake_data):
             return False, "GitHub credentials not configured in secrets"
         
         # Connect to GitHub
-        g = Github(token)
-        repo = g.get_user().get_repo(repo_name.split("/")[1])
+        repo = get_github_repo(token, repo_name)
         
         # Create filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{np.random.randint(1000, 9999)}.jpg"
+        now = datetime.now()
+        filename = f"{now:%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:8]}.jpg"
         filepath = f"training_data/{damage_class}/{filename}"
+        metadata_file = "training_data/dataset_metadata.csv"
         
-        # Convert image to bytes
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='JPEG')
-        img_byte_arr.seek(0)
-        img_base64 = base64.b64encode(img_byte_arr.getvalue()).decode()
+        # Convert image to the JPEG bytes that get committed
+        image_bytes = dataset_jpeg(image_bytes, from_camera)
+        
+        # Read the metadata CSV while the image uploads; only the metadata write has to wait for it.
+        # The read gets its own client because a PyGithub connection can't carry two requests at once.
+        metadata_repo = get_github_repo(token, repo_name)
+        executor = ThreadPoolExecutor(max_workers=1)
+        metadata_future = executor.submit(metadata_repo.get_contents, metadata_file)
+        executor.shutdown(wait=False)
         
         # Upload image to GitHub
         try:
             repo.create_file(
                 path=filepath,
                 message=f"Add {damage_class} image: {filename}",
-                content=img_byte_arr.getvalue(),
+                content=image_bytes,
                 branch="main"
             )
         except Exception as e:
@@ -118,10 +201,8 @@ def save_image_to_github(image, damage_class, earthquake_data):
                 raise e
         
         # Update metadata CSV
-        metadata_file = "training_data/dataset_metadata.csv"
-        
         new_record = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now.isoformat(),
             "damage_class": damage_class,
             "earthquake_magnitude": earthquake_data.get("magnitude", "N/A") if earthquake_data else "N/A",
             "earthquake_location": earthquake_data.get("location", "N/A") if earthquake_data else "N/A",
@@ -131,19 +212,19 @@ def save_image_to_github(image, damage_class, earthquake_data):
         
         # Get existing CSV from GitHub
         try:
-            file_contents = repo.get_contents(metadata_file)
+            file_contents = metadata_future.result()
             csv_content = file_contents.decoded_content.decode('utf-8')
-            df = pd.read_csv(io.StringIO(csv_content))
         except:
-            df = pd.DataFrame(columns=["timestamp", "damage_class", "earthquake_magnitude", "earthquake_location", "filename", "image_path"])
+            file_contents = None
+            csv_content = ",".join(new_record) + "\n"
         
-        # Add new record
-        df = pd.concat([df, pd.DataFrame([new_record])], ignore_index=True)
+        # Append the new record as one CSV line instead of re-parsing and rewriting every row
+        if not csv_content.endswith("\n"):
+            csv_content += "\n"
+        csv_string = csv_content + pd.DataFrame([new_record]).to_csv(index=False, header=False)
         
-        # Upload updated CSV to GitHub
-        csv_string = df.to_csv(index=False)
-        try:
-            file_contents = repo.get_contents(metadata_file)
+        # Upload updated CSV to GitHub (reusing the sha fetched above)
+        if file_contents is not None:
             repo.update_file(
                 path=metadata_file,
                 message=f"Update dataset metadata - {damage_class}: {filename}",
@@ -151,7 +232,7 @@ def save_image_to_github(image, damage_class, earthquake_data):
                 sha=file_contents.sha,
                 branch="main"
             )
-        except:
+        else:
             repo.create_file(
                 path=metadata_file,
                 message="Create dataset metadata",
@@ -159,11 +240,13 @@ def save_image_to_github(image, damage_class, earthquake_data):
                 branch="main"
             )
         
+        get_dataset_info.clear()  # the next expander render picks up the new row
         return True, f"✅ Image committed to GitHub: {filepath}"
     
     except Exception as e:
         return False, f"Error: {str(e)}"
 
+@st.cache_data(ttl=300, show_spinner=False)
 def get_dataset_info():
     """Get dataset info from GitHub"""
     try:
@@ -173,15 +256,14 @@ def get_dataset_info():
         if not token or not repo_name:
             return None
         
-        g = Github(token)
-        repo = g.get_user().get_repo(repo_name.split("/")[1])
+        repo = get_github_repo(token, repo_name)
         
         metadata_file = "training_data/dataset_metadata.csv"
         
         try:
             file_contents = repo.get_contents(metadata_file)
             csv_content = file_contents.decoded_content.decode('utf-8')
-            df = pd.read_csv(io.StringIO(csv_content))
+            df = pd.read_csv(io.StringIO(csv_content), dtype={'damage_class': 'category'})
             return df
         except:
             return None
@@ -191,72 +273,196 @@ def get_dataset_info():
 
 # ==================== OTHER FUNCTIONS ====================
 
-def fetch_earthquake_data(url):
-    response = requests.get(url)
-    data = response.json()
+@st.cache_resource
+def get_http_session():
+    """Shared HTTP session so USGS requests reuse pooled connections across reruns"""
+    # The on-disk cache survives worker restarts and revalidates with USGS's Cache-Control/ETag headers
+    session = CachedSession(".usgs_cache", backend="sqlite", expire_after=60, cache_control=True, allowable_codes=(200,))
+    session.headers.update({"Accept-Encoding": "gzip"})
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=1))
+    return session
+
+def feed_refresh_bucket(url):
+    """Wall-clock bucket that rolls over once per feed TTL"""
+    return int(time.time() // FEED_TTL[url])
+
+def philippines_mask(lat, lon):
+    """Boolean mask of coordinates inside the Philippines bounding box"""
+    min_lon, min_lat, max_lon, max_lat = PH_BBOX
+    mask = lat >= min_lat
+    mask &= lat <= max_lat
+    mask &= lon >= min_lon
+    mask &= lon <= max_lon
+    return mask
+
+@st.cache_data(ttl=600, max_entries=8, show_spinner=False)
+def fetch_ph_earthquakes(url, refresh_bucket):
+    """Fetch a USGS feed and build a DataFrame of only the Philippines events"""
+    # refresh_bucket only keys the cache so each feed expires on its own TTL
+    response = get_http_session().get(url, timeout=10)
+    # The session revalidates with If-None-Match/If-Modified-Since, so an unchanged feed comes back
+    # with the same validator and its parsed frame is reused instead of re-parsed
+    version = response.headers.get("ETag") or response.headers.get("Last-Modified")
+    return parse_ph_feed(response.content, url, version or hashlib.md5(response.content).hexdigest())
+
+@st.cache_data(ttl=600, max_entries=4, show_spinner=False)
+def parse_ph_feed(_content, url, version):
+    """Parse a USGS GeoJSON feed into a DataFrame of only the Philippines events"""
+    data = orjson.loads(_content)
     features = data['features']
-    earthquakes = []
-    for feature in features:
-        properties = feature['properties']
-        geometry = feature['geometry']
-        utc_time = pd.to_datetime(properties['time'], unit='ms')
-        ph_time = utc_time.tz_localize('UTC').tz_convert(pytz.timezone('Asia/Manila'))
-        earthquakes.append({
-            "place": properties['place'],
-            "magnitude": properties['mag'],
-            "depth_km": geometry['coordinates'][2],
-            "time_ph": ph_time,
-            "latitude": geometry['coordinates'][1],
-            "longitude": geometry['coordinates'][0]
-        })
-    return pd.DataFrame(earthquakes)
-
-def filter_philippines_earthquakes(df):
-    return df[
-        (df['latitude'] >= 4) & (df['latitude'] <= 20) &
-        (df['longitude'] >= 119) & (df['longitude'] <= 131)
-    ]
-
-def check_recent_earthquakes():
-    try:
-        url = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_hour.geojson"
-        response = requests.get(url, timeout=5)
-        data = response.json()
-        
-        for feature in data['features']:
-            properties = feature['properties']
-            geometry = feature['geometry']
-            lat, lon = geometry['coordinates'][1], geometry['coordinates'][0]
-            
-            if 4 <= lat <= 20 and 119 <= lon <= 131:
-                if properties['mag'] >= 4.0:
-                    utc_time = pd.to_datetime(properties['time'], unit='ms')
-                    ph_time = utc_time.tz_localize('UTC').tz_convert(pytz.timezone('Asia/Manila'))
-                    return {
-                        "magnitude": properties['mag'],
-                        "depth": geometry['coordinates'][2],
-                        "location": properties['place'],
-                        "latitude": lat,
-                        "longitude": lon,
-                        "time_ph": ph_time,
-                        "time_utc": utc_time
-                    }
-        return None
-    except:
+    coords = np.array([feature['geometry']['coordinates'] for feature in features], dtype=np.float32).reshape(-1, 3)
+    in_ph = np.flatnonzero(philippines_mask(coords[:, 1], coords[:, 0]))
+    props = [features[i]['properties'] for i in in_ph]
+    times = np.fromiter((p['time'] for p in props), dtype=np.int64, count=len(props))
+    # Store rows newest-first once per fetch so the alert scan and data table never sort per rerun
+    newest_first = np.argsort(-times, kind='stable')
+    coords = coords[in_ph[newest_first]]
+    props = [props[i] for i in newest_first]
+    return pd.DataFrame({
+        "place": pd.Categorical([p['place'] for p in props]),
+        "magnitude": np.array([p['mag'] for p in props], dtype=float),
+        "depth_km": coords[:, 2],
+        "time_ph": pd.to_datetime(times[newest_first], unit='ms', utc=True).tz_convert(PH_TZ),
+        "latitude": coords[:, 1],
+        "longitude": coords[:, 0]
+    })
+
+def check_recent_earthquakes(ph_realtime_df):
+    hits = np.flatnonzero(ph_realtime_df['magnitude'].to_numpy() >= 4.0)
+    if hits.size == 0:
         return None
+    i = hits[0]
+    time_ph = ph_realtime_df['time_ph'].iat[i]
+    return {
+        "magnitude": ph_realtime_df['magnitude'].iat[i],
+        "depth": ph_realtime_df['depth_km'].iat[i],
+        "location": ph_realtime_df['place'].iat[i],
+        "latitude": ph_realtime_df['latitude'].iat[i],
+        "longitude": ph_realtime_df['longitude'].iat[i],
+        "time_ph": time_ph,
+        "time_utc": time_ph.tz_convert(UTC_TZ)
+    }
 
-def classify_building_damage_hosted(image):
+def load_ph_earthquakes():
+    """Return the Philippines frames per feed URL, refetching (concurrently) only feeds whose refresh bucket rolled over"""
+    if "ph_data" not in st.session_state:
+        st.session_state.ph_data = {}
+    feed_buckets = {url: feed_refresh_bucket(url) for url in FEED_TTL}
+    stale_feeds = [url for url, bucket in feed_buckets.items() if st.session_state.ph_data.get(url, (None,))[0] != bucket]
+    if len(stale_feeds) > 1:
+        with ThreadPoolExecutor(max_workers=len(stale_feeds)) as executor:
+            frames = list(executor.map(fetch_ph_earthquakes, stale_feeds, [feed_buckets[url] for url in stale_feeds]))
+    else:
+        frames = [fetch_ph_earthquakes(url, feed_buckets[url]) for url in stale_feeds]
+    for url, frame in zip(stale_feeds, frames):
+        st.session_state.ph_data[url] = (feed_buckets[url], frame)
+    if USGS_HOUR_URL in stale_feeds:
+        st.session_state.current_earthquake = check_recent_earthquakes(st.session_state.ph_data[USGS_HOUR_URL][1])
+    ph_data = st.session_state.ph_data
+    # Report the bucket each frame was fetched in, so shared caches keyed on it never mix refreshes
+    return {url: frame for url, (bucket, frame) in ph_data.items()}, {url: bucket for url, (bucket, frame) in ph_data.items()}
+
+@st.cache_resource(ttl=600, max_entries=4, show_spinner=False)
+def build_scatter_map(_df, feed_url, refresh_bucket):
+    """Build the earthquake map figure, cached per feed refresh instead of hashing the frame"""
+    # cache_resource hands back the same Figure; cache_data would re-validate it from a pickle on every hit
+    import plotly.express as px
+    df = _df[MAP_COLUMNS]
+    if len(df) > MAP_MAX_POINTS:
+        df = df.nlargest(MAP_MAX_POINTS, "magnitude")
+    fig = px.scatter_mapbox(df, **MAP_KWARGS)
+    fig.update_layout(**MAP_LAYOUT)
+    return fig
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def decode_image(image_bytes):
+    """Decode a camera/upload image once per distinct photo, capped at 1024px for display and saving"""
+    from PIL import Image, ImageOps
+    image = Image.open(io.BytesIO(image_bytes))
+    image.draft("RGB", (1024, 1024))
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    image.thumbnail((1024, 1024), Image.Resampling.LANCZOS)
+    return image
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def dataset_jpeg(image_bytes, from_camera):
+    """JPEG bytes to commit for a photo; small upright camera frames go through untouched"""
+    from PIL import Image
+    # Uploads are always re-encoded so their EXIF (GPS, device details) never reaches the public dataset
+    if from_camera:
+        image = Image.open(io.BytesIO(image_bytes))  # only reads the header
+        if image.format == "JPEG" and image.mode == "RGB" and max(image.size) <= 1024 and image.getexif().get(0x0112, 1) == 1:
+            return image_bytes
+    buffer = io.BytesIO()
+    decode_image(image_bytes).save(buffer, format='JPEG', quality=85, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+@st.cache_data(ttl=600, max_entries=4, show_spinner=False)
+def summarize_feed(_df, feed_url, refresh_bucket):
+    """Max/mean magnitude and mean depth for a feed, computed once per feed refresh"""
+    if _df.empty:
+        return 0, 0, 0
+    magnitudes = _df['magnitude'].to_numpy()
+    return np.nanmax(magnitudes), np.nanmean(magnitudes), np.nanmean(_df['depth_km'].to_numpy())
+
+@st.cache_resource(show_spinner=False)
+def load_damage_model():
+    """TFLite interpreter, its output labels, tensor indices and a reusable input buffer, built once per process"""
+    from ai_edge_litert.interpreter import Interpreter
+    with open(DAMAGE_LABELS_PATH) as f:
+        labels = tuple(line.split(maxsplit=1)[1].strip().upper() for line in f if line.strip())
+    # Size the thread pool to the CPUs this process may use, not the host's core count
+    try:
+        num_threads = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS/Windows
+        num_threads = os.cpu_count() or 1
+    interpreter = Interpreter(model_path=DAMAGE_MODEL_PATH, num_threads=min(num_threads, 4))
+    interpreter.allocate_tensors()
+    input_details = interpreter.get_input_details()[0]
+    output_details = interpreter.get_output_details()[0]
+    if sorted(labels) != sorted(DAMAGE_CLASSES) or len(labels) != output_details['shape'][-1]:
+        raise ValueError(f"labels.txt must list {', '.join(DAMAGE_CLASSES)} once each, in model output order")
+    # Float and uint8 exports are supported; other quantized inputs would need the input tensor's scale
+    if input_details['dtype'] not in (np.float32, np.uint8):
+        raise ValueError(f"Unsupported model input type {np.dtype(input_details['dtype']).name}; "
+                         "export the model as float32 or uint8-quantized")
+    input_buf = np.empty(input_details['shape'], dtype=input_details['dtype'])
+    # Every session shares this interpreter and invoke() is not thread-safe
+    return (interpreter, labels, input_details['index'], output_details['index'], output_details['quantization'],
+            input_buf, threading.Lock())
+
+def classify_building_damage(image):
     """AI classification of building damage"""
     try:
-        import time
-        time.sleep(1)
+        if not os.path.exists(DAMAGE_LABELS_PATH):
+            # Without the export's labels.txt the model's output order is unknown, so keep the fixed scores
+            predictions = [0.8, 0.15, 0.05]
+            predicted_idx = predictions.index(max(predictions))
+            return DAMAGE_CLASSES[predicted_idx], predictions[predicted_idx], predictions
         
-        class_names = ["SAFE", "DAMAGED", "UNSAFE"]
-        predictions = [0.8, 0.15, 0.05]
+        from PIL import ImageOps
+        interpreter, labels, input_index, output_index, (output_scale, output_zero_point), input_buf, lock = load_damage_model()
+        height, width = input_buf.shape[1:3]
+        # Teachable Machine models take a centre crop; float models want pixels scaled to [-1, 1]
+        resized = ImageOps.fit(image, (width, height))
+        pixels = np.asarray(resized)
+        with lock:
+            if input_buf.dtype == np.uint8:
+                np.copyto(input_buf[0], pixels)  # quantized models normalise internally
+            else:
+                # Scale straight into the input buffer in float32, with no intermediate arrays
+                np.multiply(pixels, np.float32(1 / 127.5), out=input_buf[0])
+                input_buf -= 1
+            interpreter.set_tensor(input_index, input_buf)
+            interpreter.invoke()
+            scores = interpreter.get_tensor(output_index)[0]
+        if output_scale:
+            scores = (scores.astype(np.float32) - output_zero_point) * output_scale
         
-        predicted_idx = np.argmax(predictions)
-        predicted_class = class_names[predicted_idx]
-        confidence = predictions[predicted_idx]
+        predicted_idx = int(scores.argmax())
+        predicted_class = labels[predicted_idx]
+        confidence = float(scores[predicted_idx])
+        predictions = dict(zip(labels, scores.tolist()))
         
         return predicted_class, confidence, predictions
     except Exception as e:
@@ -268,159 +474,158 @@ def classify_building_damage_hosted(image):
 st.title("PH Earthquake Response")
 st.markdown("Emergency Building Damage Assessment + Dataset Collection")
 
-st.session_state.current_earthquake = check_recent_earthquakes()
+# Earthquake status refreshes on its own timer without rerunning the assessment flow
+@st.fragment(run_every=60)
+def status_panel():
+    frames, _ = load_ph_earthquakes()
+    ph_realtime, ph_historical = frames[USGS_HOUR_URL], frames[USGS_MONTH_URL]
+    
+    # Earthquake status strip, emitted as a single markdown block
+    if st.session_state.current_earthquake:
+        alert_card = f"""<div style="background: #dc3545; color: white; padding: 1rem; border-radius: 10px; text-align: center;">
+                    <h3>EARTHQUAKE DETECTED</h3>
+                    <p style="font-size: 1.2rem; margin: 0;">Mag {st.session_state.current_earthquake['magnitude']}</p>
+                </div>"""
+    else:
+        alert_card = NO_ALERT_CARD
+
+    st.markdown(f"""
+        <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(180px, 1fr)); gap: 1rem;">
+                {alert_card}
+                {COUNT_CARD.format(label="Earthquakes (1hr)", count=len(ph_realtime))}
+                {COUNT_CARD.format(label="Earthquakes (1mo)", count=len(ph_historical))}
+        </div>
+    """, unsafe_allow_html=True)
 
-# Earthquake status
-col1, col2, col3 = st.columns(3)
+    st.divider()
 
-with col1:
+    # Service status
     if st.session_state.current_earthquake:
+        eq = st.session_state.current_earthquake
         st.markdown(f"""
-            <div style="background: #dc3545; color: white; padding: 1rem; border-radius: 10px; text-align: center;">
-                <h3>EARTHQUAKE DETECTED</h3>
-                <p style="font-size: 1.2rem; margin: 0;">Mag {st.session_state.current_earthquake['magnitude']}</p>
+            <div style="background: linear-gradient(135deg, #dc3545 0%, #c82333 100%); color: white; padding: 2rem; border-radius: 15px; margin: 1rem 0; text-align: center;">
+                <h2>EARTHQUAKE DETECTED</h2>
+                <p><strong>Magnitude:</strong> {eq['magnitude']}</p>
+                <p><strong>Location:</strong> {eq['location']}</p>
+                <p><strong>Time:</strong> {eq['time_ph'].strftime('%H:%M:%S')}</p>
+                <p><strong>Depth:</strong> {eq['depth']:.1f} km</p>
             </div>
         """, unsafe_allow_html=True)
     else:
-        st.markdown(f"""
-            <div style="background: #28a745; color: white; padding: 1rem; border-radius: 10px; text-align: center;">
-                <h3>NO ALERT</h3>
-                <p style="font-size: 0.9rem; margin: 0;">Ready to monitor</p>
-            </div>
-        """, unsafe_allow_html=True)
-
-with col2:
-    realtime_data = fetch_earthquake_data("https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_hour.geojson")
-    ph_realtime = filter_philippines_earthquakes(realtime_data)
-    st.metric("Earthquakes (1hr)", len(ph_realtime))
-
-with col3:
-    historical_data = fetch_earthquake_data("https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_month.geojson")
-    ph_historical = filter_philippines_earthquakes(historical_data)
-    st.metric("Earthquakes (1mo)", len(ph_historical))
-
-st.divider()
+        st.markdown(SERVICE_READY_HTML, unsafe_allow_html=True)
+
+    if st.button("Refresh Earthquake Data", use_container_width=True):
+        fetch_ph_earthquakes.clear()
+        build_scatter_map.clear()
+        summarize_feed.clear()
+        get_http_session().cache.clear()
+        st.session_state.ph_data = {}
+        st.rerun()
 
-# Service status
-if st.session_state.current_earthquake:
-    eq = st.session_state.current_earthquake
-    st.markdown(f"""
-        <div style="background: linear-gradient(135deg, #dc3545 0%, #c82333 100%); color: white; padding: 2rem; border-radius: 15px; margin: 1rem 0; text-align: center;">
-            <h2>EARTHQUAKE DETECTED</h2>
-            <p><strong>Magnitude:</strong> {eq['magnitude']}</p>
-            <p><strong>Location:</strong> {eq['location']}</p>
-            <p><strong>Time:</strong> {eq['time_ph'].strftime('%H:%M:%S')}</p>
-            <p><strong>Depth:</strong> {eq['depth']:.1f} km</p>
-        </div>
-    """, unsafe_allow_html=True)
-else:
-    st.markdown("""
-        <div style="background: linear-gradient(135deg, #28a745 0%, #20c997 100%); color: white; padding: 2rem; border-radius: 15px; margin: 1rem 0; text-align: center;">
-            <h2>SERVICE READY</h2>
-            <p>Damage assessment + dataset collection active</p>
-        </div>
-    """, unsafe_allow_html=True)
+    st.divider()
 
-st.divider()
+status_panel()
 
-# Main assessment section
-st.header("ASSESS BUILDING DAMAGE")
+# Camera/upload widgets rerun only this fragment, not the earthquake feeds or analysis
+@st.fragment
+def assessment_panel():
+    # Main assessment section
+    st.header("ASSESS BUILDING DAMAGE")
 
-col1, col2 = st.columns(2)
+    col1, col2 = st.columns(2)
 
-with col1:
-    st.subheader("Camera")
-    camera_photo = st.camera_input("Take a photo", key="camera")
+    with col1:
+        st.subheader("Camera")
+        camera_photo = st.camera_input("Take a photo", key="camera")
 
-with col2:
-    st.subheader("Upload")
-    uploaded_file = st.file_uploader("Select image", type=["jpg", "jpeg", "png"], key="upload")
+    with col2:
+        st.subheader("Upload")
+        uploaded_file = st.file_uploader("Select image", type=["jpg", "jpeg", "png"], key="upload")
 
-image_to_process = None
-if camera_photo:
-    image_to_process = Image.open(camera_photo)
-elif uploaded_file:
-    image_to_process = Image.open(uploaded_file)
+    image_to_process = None
+    image_bytes = None
+    from_camera = camera_photo is not None
+    if camera_photo or uploaded_file:
+        image_bytes = (camera_photo or uploaded_file).getvalue()
+        image_to_process = decode_image(image_bytes)
 
-if image_to_process:
-    st.divider()
-    st.image(image_to_process, caption="Building Assessment", use_container_width=True)
+    if image_to_process:
+        st.divider()
+        st.image(image_to_process, caption="Building Assessment", use_container_width=True)
     
-    if st.button("ANALYZE DAMAGE", type="primary", use_container_width=True):
-        with st.spinner("AI is analyzing..."):
-            predicted_class, confidence, all_predictions = classify_building_damage_hosted(image_to_process)
+        if st.button("ANALYZE DAMAGE", type="primary", use_container_width=True):
+            with st.spinner("AI is analyzing..."):
+                predicted_class, confidence, all_predictions = classify_building_damage(image_to_process)
             
-            if predicted_class:
-                st.session_state.assessment_results = {
-                    "class": predicted_class,
-                    "confidence": confidence,
-                    "predictions": all_predictions
-                }
-                st.rerun()
-
-# Results section
-if st.session_state.assessment_results:
-    st.divider()
+                if predicted_class:
+                    st.session_state.assessment_results = {
+                        "class": predicted_class,
+                        "confidence": confidence,
+                        "predictions": all_predictions
+                    }
+                    st.rerun(scope="fragment")
+
+    # Results section
+    if st.session_state.assessment_results:
+        st.divider()
     
-    result = st.session_state.assessment_results
-    damage_class = result['class']
-    confidence = result['confidence']
-    rec = DAMAGE_RECOMMENDATIONS[damage_class]
+        result = st.session_state.assessment_results
+        damage_class = result['class']
+        confidence = result['confidence']
     
-    st.markdown(f"""
-        <div style="background: {rec['bg_gradient']}; color: white; padding: 2rem; border-radius: 15px; margin: 1rem 0; text-align: center;">
-            <h1>{damage_class}</h1>
-            <p style="font-size: 1.1rem;">Confidence: {confidence*100:.0f}%</p>
-            <p style="font-size: 0.9rem; margin-top: 1rem;">Priority: {rec['priority']}</p>
-        </div>
-    """, unsafe_allow_html=True)
+        st.markdown(DAMAGE_BANNER_HTML[damage_class].format(confidence=confidence * 100), unsafe_allow_html=True)
     
-    st.subheader("What to Do")
-    for action in rec['actions']:
-        st.write(f"▸ {action}")
+        st.subheader("What to Do")
+        st.markdown(DAMAGE_ACTIONS_MD[damage_class])
     
-    # Save to dataset with correction option
-    st.divider()
-    st.subheader("Save to Dataset")
+        # Save to dataset with correction option
+        st.divider()
+        st.subheader("Save to Dataset")
+    
+        st.write("**Verify the assessment before saving:**")
     
-    st.write("**Verify the assessment before saving:**")
+        # Allow user to correct the prediction
+        corrected_class = st.radio(
+            "Is this assessment correct?",
+            options=DAMAGE_CLASSES,
+            index=DAMAGE_CLASSES.index(damage_class),
+            horizontal=True
+        )
     
-    # Allow user to correct the prediction
-    corrected_class = st.radio(
-        "Is this assessment correct?",
-        options=["SAFE", "DAMAGED", "UNSAFE"],
-        index=["SAFE", "DAMAGED", "UNSAFE"].index(damage_class),
-        horizontal=True
-    )
+        # Show if user corrected it
+        if corrected_class != damage_class:
+            st.warning(f"⚠️ Correcting prediction from {damage_class} → {corrected_class}")
     
-    # Show if user corrected it
-    if corrected_class != damage_class:
-        st.warning(f"⚠️ Correcting prediction from {damage_class} → {corrected_class}")
+        if st.button("Save Image to Dataset", type="primary", use_container_width=True,
+                     disabled=image_bytes is None, help=None if image_bytes else "Take or upload the photo again to save it"):
+            with st.spinner("Saving to GitHub..."):
+                success, message = save_image_to_github(
+                    image_bytes,
+                    corrected_class,
+                    st.session_state.current_earthquake or {"magnitude": "N/A", "location": "Manual Test"},
+                    from_camera
+                )
+                if success:
+                    st.success(message)
+                    st.info("✅ Image automatically committed to GitHub training_data folder!")
+                else:
+                    st.error(message)
     
-    if st.button("Save Image to Dataset", type="primary", use_container_width=True):
-        with st.spinner("Saving to GitHub..."):
-            success, message = save_image_to_github(
-                image_to_process,
-                corrected_class,
-                st.session_state.current_earthquake or {"magnitude": "N/A", "location": "Manual Test"}
+        # Emergency contacts
+        if damage_class == "UNSAFE":
+            st.divider()
+            st.error("CRITICAL - CONTACT EMERGENCY SERVICES")
+            st.markdown(
+                "📞 **NDRRMC Hotline:** 1-800-1-73239 (1-800-1-READY)\n\n"
+                "📞 **Bureau of Fire Protection (BFP):** 911"
             )
-            if success:
-                st.success(message)
-                st.info("✅ Image automatically committed to GitHub training_data folder!")
-            else:
-                st.error(message)
     
-    # Emergency contacts
-    if damage_class == "UNSAFE":
         st.divider()
-        st.error("CRITICAL - CONTACT EMERGENCY SERVICES")
-        st.write("📞 **NDRRMC Hotline:** 1-800-1-73239 (1-800-1-READY)")
-        st.write("📞 **Bureau of Fire Protection (BFP):** 911")
-    
-    st.divider()
-    if st.button("Assess Another Building", use_container_width=True):
-        st.session_state.assessment_results = None
-        st.rerun()
+        if st.button("Assess Another Building", use_container_width=True):
+            st.session_state.assessment_results = None
+            st.rerun(scope="fragment")
+
+assessment_panel()
 
 # Dataset management section
 st.divider()
@@ -453,73 +658,65 @@ with st.expander("View Training Dataset"):
     else:
         st.info("No images in dataset yet. Save images from damage assessments above.")
 
-# Earthquake data analysis
-st.divider()
-st.header("Earthquake Data Analysis")
+@st.fragment(run_every=60)
+def analysis_panel():
+    frames, feed_buckets = load_ph_earthquakes()
+    ph_realtime, ph_historical = frames[USGS_HOUR_URL], frames[USGS_MONTH_URL]
+    
+    # Earthquake data analysis
+    st.divider()
+    st.header("Earthquake Data Analysis")
 
-analysis_tab1, analysis_tab2, analysis_tab3 = st.tabs(["Maps", "Analysis", "Data Tables"])
+    analysis_tab1, analysis_tab2, analysis_tab3 = st.tabs(["Maps", "Analysis", "Data Tables"])
 
-with analysis_tab1:
-    st.subheader("Earthquake Maps")
+    with analysis_tab1:
+        st.subheader("Earthquake Maps")
     
-    col1, col2 = st.columns(2)
+        col1, col2 = st.columns(2)
     
-    with col1:
-        st.write("**Real-Time (Last Hour)**")
-        if len(ph_realtime) > 0:
-            fig_realtime = px.scatter_mapbox(
-                ph_realtime,
-                lat="latitude",
-                lon="longitude",
-                size="magnitude",
-                color="magnitude",
-                hover_name="place",
-                zoom=5,
-                height=500
-            )
-            fig_realtime.update_layout(mapbox_style="open-street-map", mapbox=dict(center=dict(lat=12.5, lon=125), zoom=5))
-            st.plotly_chart(fig_realtime, use_container_width=True)
-        else:
-            st.info("No earthquakes")
+        with col1:
+            st.write("**Real-Time (Last Hour)**")
+            if len(ph_realtime) > 0:
+                fig_realtime = build_scatter_map(ph_realtime, USGS_HOUR_URL, feed_buckets[USGS_HOUR_URL])
+                st.plotly_chart(fig_realtime, use_container_width=True)
+            else:
+                st.info("No earthquakes")
     
-    with col2:
-        st.write("**Historical (Last Month)**")
+        with col2:
+            st.write("**Historical (Last Month)**")
+            if len(ph_historical) > 0:
+                fig_historical = build_scatter_map(ph_historical, USGS_MONTH_URL, feed_buckets[USGS_MONTH_URL])
+                st.plotly_chart(fig_historical, use_container_width=True)
+                if len(ph_historical) > MAP_MAX_POINTS:
+                    st.caption(f"Showing the {MAP_MAX_POINTS} strongest of {len(ph_historical)} earthquakes")
+            else:
+                st.info("No data")
+
+    with analysis_tab2:
+        st.subheader("Statistical Analysis")
+    
+        max_mag, avg_mag, avg_depth = summarize_feed(ph_historical, USGS_MONTH_URL, feed_buckets[USGS_MONTH_URL])
+    
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Total (1mo)", len(ph_historical))
+        with col2:
+            st.metric("Max Mag", f"{max_mag:.1f}")
+        with col3:
+            st.metric("Avg Mag", f"{avg_mag:.2f}")
+        with col4:
+            st.metric("Avg Depth", f"{avg_depth:.1f}km")
+
+    with analysis_tab3:
+        st.subheader("Earthquake Data")
         if len(ph_historical) > 0:
-            fig_historical = px.scatter_mapbox(
-                ph_historical,
-                lat="latitude",
-                lon="longitude",
-                size="magnitude",
-                color="magnitude",
-                hover_name="place",
-                zoom=5,
-                height=500
+            # Frames are already stored newest-first by fetch_ph_earthquakes
+            st.dataframe(
+                ph_historical[['place', 'magnitude', 'depth_km', 'time_ph']],
+                use_container_width=True,
+                hide_index=True
             )
-            fig_historical.update_layout(mapbox_style="open-street-map", mapbox=dict(center=dict(lat=12.5, lon=125), zoom=5))
-            st.plotly_chart(fig_historical, use_container_width=True)
-        else:
-            st.info("No data")
 
-with analysis_tab2:
-    st.subheader("Statistical Analysis")
-    
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.metric("Total (1mo)", len(ph_historical))
-    with col2:
-        max_mag = ph_historical['magnitude'].max() if len(ph_historical) > 0 else 0
-        st.metric("Max Mag", f"{max_mag:.1f}")
-    with col3:
-        avg_mag = ph_historical['magnitude'].mean() if len(ph_historical) > 0 else 0
-        st.metric("Avg Mag", f"{avg_mag:.2f}")
-    with col4:
-        avg_depth = ph_historical['depth_km'].mean() if len(ph_historical) > 0 else 0
-        st.metric("Avg Depth", f"{avg_depth:.1f}km")
-
-with analysis_tab3:
-    st.subheader("Earthquake Data")
-    if len(ph_historical) > 0:
-        display = ph_historical[['place', 'magnitude', 'depth_km', 'time_ph']].sort_values('time_ph', ascending=False)
-        st.dataframe(display, use_container_width=True, hide_index=True)
+analysis_panel()
 
 st.caption("PH Earthquake Response v4.0 | USGS + Teachable Machine + GCS Dataset")